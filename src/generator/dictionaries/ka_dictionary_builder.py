@@ -1,12 +1,35 @@
 import requests
+from requests.adapters import HTTPAdapter
 import re
+import bz2
+import time
+import hashlib
+import os
+import tempfile
 from pathlib import Path
 from collections import Counter
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from xml.etree.ElementTree import iterparse
 import random
 import json
+import numpy as np
 from utils import BASE_DIR
 
 
+# Sequences of Georgian characters. The range ა-ჰ (U+10D0-U+10F0) is exactly
+# the 33 letters of the modern alphabet, archaic letters are outside of it.
+_WORD_RE = re.compile(r'[ა-ჰ]+')
+
+# MediaWiki markup removed from dump texts before word extraction
+_REF_RE = re.compile(r'<ref[^>]*/>|<ref[^>]*>.*?</ref>', re.DOTALL)
+_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+_TEMPLATE_RE = re.compile(r'\{\{[^{}]*\}\}')
+_NAMESPACE_LINK_RE = re.compile(r'\[\[[^\[\]|:]+:[^\[\]]*\]\]')
+_LINK_RE = re.compile(r'\[\[(?:[^\[\]|]*\|)?([^\[\]]*)\]\]')
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
 class GeorgianDictionaryBuilder:
     """Build a comprehensive Georgian word dictionary from Wikipedia"""
 
@@ -14,14 +37,33 @@ class GeorgianDictionaryBuilder:
         self.georgian_chars = "აბგდევზთიკლმნოპჟრსტუფქღყშჩცძწჭხჯჰ"
         self.min_word_length = 2
         self.max_word_length = 20
+        # Cap on unique words held while counting, None counts exactly.
+        # When exceeded, rarest words are pruned, so counts become approximate.
+        self.max_vocab_size = None
         self.headers = {
             'User-Agent': 'GeorgianDictionaryBot/1.0 (Educational project; contact@example.com)'
         }
+        # Max number of requests in flight at once
+        self.max_concurrent = 20
+        # Retries of rate-limited (429), 5xx and failed connections, with exponential backoff
+        self.max_retries = 4
+        self.retry_backoff = 1.0
+        # Fetched page texts are cached on disk so repeated builds skip the network
+        self.cache_dir = BASE_DIR / "data" / "wiki_cache"
+        self.cache_expire_days = 30
+
+        # Shared session reuses connections across requests
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_maxsize=self.max_concurrent)
+        self.session.mount("https://", adapter)
 
     def fetch_wikipedia_pages(self, num_pages: int = 100) -> list[str]:
-        """Fetch random Georgian Wikipedia pages using the API"""
-        all_text = []
+        """Fetch random Georgian Wikipedia pages using the API.
 
+        Requests are I/O-bound, so they are issued concurrently from a thread pool
+        limited to `self.max_concurrent` requests in flight.
+        """
         # Start with curated important pages
         seed_titles = [
             "საქართველო", "თბილისი", "საქართველოს_ისტორია",
@@ -30,28 +72,33 @@ class GeorgianDictionaryBuilder:
             "ეკონომიკა", "პოლიტიკა", "გეოგრაფია", "ფილოსოფია"
         ]
 
-        print(f"Fetching {len(seed_titles)} seed pages...")
-        for title in seed_titles:
-            text = self._fetch_page_content(title)
-            if text:
-                all_text.append(text)
-
         # Fetch additional random pages
+        titles = list(seed_titles)
         remaining = num_pages - len(seed_titles)
         if remaining > 0:
-            print(f"Fetching {remaining} random pages...")
-            for i in range(remaining):
-                text = self._fetch_random_page()
+            print(f"Fetching {remaining} random page titles...")
+            titles.extend(self._fetch_random_titles(remaining))
+
+        print(f"Fetching {len(titles)} pages ({len(seed_titles)} seed, {len(titles) - len(seed_titles)} random)...")
+        all_text = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+            futures = [executor.submit(self._fetch_page_content, title) for title in titles]
+            for i, future in enumerate(as_completed(futures)):
+                text = future.result()
                 if text:
                     all_text.append(text)
                 if (i + 1) % 10 == 0:
-                    print(f"  Fetched {i + 1}/{remaining} random pages...")
+                    print(f"  Fetched {i + 1}/{len(titles)} pages...")
 
         return all_text
 
     def _fetch_page_content(self, title: str) -> str:
-        """Fetch a specific Wikipedia page content"""
-        url = "https://ka.wikipedia.org/w/api.php"
+        """Fetch a specific Wikipedia page content, using the on-disk cache if possible"""
+        cache_path = self.cache_dir / f"{hashlib.sha1(title.encode('utf-8')).hexdigest()}.txt"
+        max_age = self.cache_expire_days * 86400
+        if cache_path.exists() and time.time() - cache_path.stat().st_mtime < max_age:
+            return cache_path.read_text(encoding="utf-8")
+
         params = {
             "action": "query",
             "format": "json",
@@ -62,60 +109,165 @@ class GeorgianDictionaryBuilder:
         }
 
         try:
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
-            data = response.json()
+            data = self._api_get(params)
             pages = data.get("query", {}).get("pages", {})
 
             for page_id, page_data in pages.items():
                 if "extract" in page_data:
-                    return page_data["extract"]
+                    text = page_data["extract"]
+                    self._write_cache(cache_path, text)
+                    return text
         except Exception as e:
             print(f"Error fetching page '{title}': {e}")
 
         return ""
 
-    def _fetch_random_page(self) -> str:
-        """Fetch a random Wikipedia page"""
-        url = "https://ka.wikipedia.org/w/api.php"
-        params = {
-            "action": "query",
-            "format": "json",
-            "list": "random",
-            "rnnamespace": 0,
-            "rnlimit": 1
-        }
+    def _write_cache(self, cache_path: Path, text: str):
+        """Write a cache file atomically, via a temp file renamed into place.
 
+        An interrupted run or two threads fetching the same title can then never
+        leave a truncated file behind that would be trusted until it expires.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
         try:
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
-            data = response.json()
-            random_pages = data.get("query", {}).get("random", [])
-
-            if random_pages:
-                title = random_pages[0]["title"]
-                return self._fetch_page_content(title)
-        except Exception as e:
-            print(f"Error fetching random page: {e}")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _api_get(self, params: dict) -> dict:
+        """Query the Wikipedia API, retrying transient failures.
+
+        Rate limiting (429), server errors (5xx), timeouts and connection errors
+        are retried up to `self.max_retries` times, waiting `Retry-After` seconds
+        if the server sends it, otherwise with jittered exponential backoff.
+        """
+        url = "https://ka.wikipedia.org/w/api.php"
 
-        return ""
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self.session.get(url, params=params, timeout=10)
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json()
+                error = requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+                retry_after = response.headers.get("Retry-After")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt == self.max_retries:
+                raise error
+
+            if retry_after and retry_after.isdigit():
+                delay = int(retry_after)
+            else:
+                delay = self.retry_backoff * 2 ** attempt + random.random()
+            time.sleep(delay)
+
+    def _fetch_random_titles(self, count: int) -> list[str]:
+        """Fetch titles of random Wikipedia pages, batching up to 500 titles per request"""
+        titles = set()
+
+        # Random lists may overlap between requests, so a few extra rounds are allowed
+        for _ in range(count // 500 + 5):
+            if len(titles) >= count:
+                break
+
+            params = {
+                "action": "query",
+                "format": "json",
+                "list": "random",
+                "rnnamespace": 0,
+                "rnlimit": min(count - len(titles), 500)
+            }
 
-    def extract_words(self, texts: list[str]) -> Counter:
-        """Extract Georgian words and count their frequency"""
+            try:
+                data = self._api_get(params)
+                random_pages = data.get("query", {}).get("random", [])
+                titles.update(page["title"] for page in random_pages)
+            except Exception as e:
+                print(f"Error fetching random page titles: {e}")
+
+        return list(titles)[:count]
+
+    def iter_dump_texts(self, dump_path: Path) -> Iterator[str]:
+        """Stream article texts from a compressed Wikipedia XML dump.
+
+        Only main namespace, non-redirect pages are yielded, with MediaWiki
+        markup stripped. Parsed elements are cleared as we go to keep memory flat.
+        """
+        with bz2.open(dump_path, "rb") as f:
+            context = iterparse(f, events=("start", "end"))
+            _, root = next(context)
+
+            for event, elem in context:
+                if event != "end" or not elem.tag.endswith("}page"):
+                    continue
+
+                ns = elem.findtext("{*}ns")
+                text = elem.findtext("{*}revision/{*}text")
+                if ns == "0" and text and elem.find("{*}redirect") is None:
+                    yield self._strip_wiki_markup(text)
+
+                # Drop processed pages from the tree
+                root.clear()
+
+    def _strip_wiki_markup(self, text: str) -> str:
+        """Remove references, templates, links and HTML tags from wikitext"""
+        text = _COMMENT_RE.sub(" ", text)
+        text = _REF_RE.sub(" ", text)
+
+        # Templates can be nested, remove innermost ones until none are left
+        text, replaced = _TEMPLATE_RE.subn(" ", text)
+        while replaced:
+            text, replaced = _TEMPLATE_RE.subn(" ", text)
+
+        # Links can be nested too (e.g. a linked word in a file caption), unwrap
+        # innermost links and drop namespace links until nothing changes
+        replaced = True
+        while replaced:
+            text, removed = _NAMESPACE_LINK_RE.subn(" ", text)
+            text, unwrapped = _LINK_RE.subn(r"\1", text)
+            replaced = removed or unwrapped
+
+        return _TAG_RE.sub(" ", text)
+
+    def extract_words(self, texts: Iterable[str]) -> Counter:
+        """Extract Georgian words and count their frequency.
+
+        If `self.max_vocab_size` is set, words seen at most `min_reduce` times are
+        dropped whenever the vocabulary outgrows it (raising `min_reduce` each time),
+        which bounds memory on dump-scale corpora at the cost of exact tail counts.
+        """
         word_counter = Counter()
+        min_reduce = 1
 
-        for text in texts:
-            # Extract sequences of Georgian characters
-            words = re.findall(r'[ა-ჰ]+', text)
+        min_length, max_length = self.min_word_length, self.max_word_length
 
-            # Filter by length
-            valid_words = [
-                w for w in words
-                if self.min_word_length <= len(w) <= self.max_word_length
-            ]
+        for text in texts:
+            # Stream Georgian words filtered by length, only accepted matches are sliced out
+            word_counter.update(
+                m.group() for m in _WORD_RE.finditer(text)
+                if min_length <= m.end() - m.start() <= max_length
+            )
 
-            word_counter.update(valid_words)
+            if self.max_vocab_size and len(word_counter) > self.max_vocab_size:
+                self._prune_counter(word_counter, min_reduce)
+                min_reduce += 1
 
         return word_counter
 
+    def _prune_counter(self, word_counter: Counter, min_reduce: int):
+        """Remove words with count <= min_reduce from the counter in place"""
+        before = len(word_counter)
+        for word in [w for w, count in word_counter.items() if count <= min_reduce]:
+            del word_counter[word]
+        print(f"  Pruned {before - len(word_counter)} words with frequency <= {min_reduce}")
+
     def build_dictionary(self, num_pages: int = 100, min_frequency: int = 2) -> dict:
         """Build the complete dictionary with metadata"""
         print("Starting dictionary build...")
@@ -126,36 +278,65 @@ class GeorgianDictionaryBuilder:
 
         # Extract and count words
         word_counter = self.extract_words(texts)
+        return self._build_from_counter(word_counter, len(texts), min_frequency)
+
+    def build_from_dump(self, dump_path: Path, min_frequency: int = 2) -> dict:
+        """Build the complete dictionary from a Wikipedia XML dump (kawiki-*-pages-articles.xml.bz2).
+
+        The dump is read sequentially from disk, which is much faster and more
+        reproducible than crawling pages through the API.
+        """
+        print(f"Starting dictionary build from {dump_path.name}...")
+        pages_read = 0
+
+        def count_pages(texts: Iterable[str]) -> Iterator[str]:
+            nonlocal pages_read
+            for text in texts:
+                pages_read += 1
+                if pages_read % 10000 == 0:
+                    print(f"  Processed {pages_read} pages...")
+                yield text
+
+        word_counter = self.extract_words(count_pages(self.iter_dump_texts(dump_path)))
+        print(f"Processed {pages_read} pages from dump")
+        return self._build_from_counter(word_counter, pages_read, min_frequency)
+
+    def _build_from_counter(self, word_counter: Counter, pages_scraped: int, min_frequency: int) -> dict:
+        """Filter counted words and assemble the dictionary with metadata"""
         print(f"Found {len(word_counter)} unique words")
 
-        # Filter by frequency
-        filtered_words = {
-            word: count for word, count in word_counter.items()
-            if count >= min_frequency
-        }
-        print(f"After frequency filter (>={min_frequency}): {len(filtered_words)} words")
+        # Keep words and counts as parallel arrays so filtering, weights and
+        # ordering run as vectorized operations instead of per-word Python code
+        words = np.fromiter(word_counter.keys(), dtype=object, count=len(word_counter))
+        freqs = np.fromiter(word_counter.values(), dtype=np.int64, count=len(word_counter))
 
-        # Categorize by frequency for weighted sampling
-        total_count = sum(filtered_words.values())
-        word_list = []
+        # Filter by frequency
+        keep = freqs >= min_frequency
+        words, freqs = words[keep], freqs[keep]
+        print(f"After frequency filter (>={min_frequency}): {len(words)} words")
 
-        for word, count in filtered_words.items():
-            word_list.append({
-                "word": word,
-                "frequency": count,
-                "weight": count / total_count,
-                "length": len(word)
-            })
+        # Sort by frequency (most common first), stable to keep ties in first-seen order
+        order = np.argsort(-freqs, kind="stable")
+        words, freqs = words[order], freqs[order]
 
-        # Sort by frequency (most common first)
-        word_list.sort(key=lambda x: x["frequency"], reverse=True)
+        # Categorize by frequency for weighted sampling
+        total_count = int(freqs.sum())
+        weights = freqs / total_count
+        lengths = np.fromiter(map(len, words), dtype=np.int32, count=len(words))
+
+        word_list = [
+            {"word": word, "frequency": count, "weight": weight, "length": length}
+            for word, count, weight, length in zip(
+                words.tolist(), freqs.tolist(), weights.tolist(), lengths.tolist()
+            )
+        ]
 
         return {
             "words": word_list,
             "total_unique": len(word_list),
             "total_occurrences": total_count,
             "metadata": {
-                "pages_scraped": len(texts),
+                "pages_scraped": pages_scraped,
                 "min_frequency": min_frequency,
                 "min_length": self.min_word_length,
                 "max_length": self.max_word_length
@@ -172,26 +353,45 @@ class GeorgianDictionaryBuilder:
             json.dump(dictionary, f, ensure_ascii=False, indent=4)
         print(f"Saved JSON dictionary to {json_path}")
 
+        # Save as compressed NumPy arrays (used by the image generator, fast to load)
+        npz_path = output_dir / "ka_dictionary.npz"
+        words = dictionary["words"]
+        np.savez_compressed(
+            npz_path,
+            words=np.array([item["word"] for item in words], dtype=str),
+            frequency=np.array([item["frequency"] for item in words], dtype=np.int64),
+            weight=np.array([item["weight"] for item in words], dtype=np.float64),
+            length=np.array([item["length"] for item in words], dtype=np.int32),
+        )
+        print(f"Saved NumPy dictionary to {npz_path}")
+
         # Save as plain text (just words, for quick loading)
         txt_path = output_dir / "ka_dictionary.txt"
         with open(txt_path, "w", encoding="utf-8") as f:
-            for item in dictionary["words"]:
-                f.write(f"{item['word']}\n")
+            f.write("".join(f"{item['word']}\n" for item in dictionary["words"]))
         print(f"Saved text dictionary to {txt_path}")
 
         # Save frequency-weighted list (for sampling)
         weighted_path = output_dir / "ka_dictionary_weighted.txt"
         with open(weighted_path, "w", encoding="utf-8") as f:
-            for item in dictionary["words"]:
-                f.write(f"{item['word']}\t{item['frequency']}\n")
+            f.write("".join(f"{item['word']}\t{item['frequency']}\n" for item in dictionary["words"]))
         print(f"Saved weighted dictionary to {weighted_path}")
 
 
 if __name__ == "__main__":
     builder = GeorgianDictionaryBuilder()
 
-    # Build dictionary from 100 Wikipedia pages
-    dictionary = builder.build_dictionary(num_pages=1000, min_frequency=2)
+    # Build dictionary from the Georgian Wikipedia dump by default
+    # (https://dumps.wikimedia.org/kawiki/latest/kawiki-latest-pages-articles.xml.bz2),
+    # fall back to crawling 1000 pages through the API if the dump is not downloaded
+    dump_path = BASE_DIR / "data" / "kawiki-latest-pages-articles.xml.bz2"
+    if dump_path.exists():
+        # Bound memory on the full dump, set to None for exact counts
+        builder.max_vocab_size = 2_000_000
+        dictionary = builder.build_from_dump(dump_path, min_frequency=2)
+    else:
+        print(f"Wikipedia dump not found at {dump_path}, using the API instead")
+        dictionary = builder.build_dictionary(num_pages=1000, min_frequency=2)
 
     # Save to dictionaries folder
     output_dir = BASE_DIR / "src" / "generator" / "dictionaries"
@@ -1,12 +1,34 @@
 import re
+import os
 import json
 from pathlib import Path
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import pymupdf as fitz
 from docx import Document
+import numpy as np
 from utils import BASE_DIR
 
 
+# Enhanced pattern to capture in a single pass over the text:
+# 1. Georgian words with hyphens: ნაწილ-ნაწილ
+# 2. Georgian words with numbers, including ordinals: მე-5, საუკუნე-5
+# 3. Roman numerals: I, II, III, IV, V, VI, VII, VIII, IX, X, XI, XII, etc.
+# 4. Regular Georgian words
+# Alternatives are tried in order, so compound forms win over their plain prefix.
+# The range ა-ჰ (U+10D0-U+10F0) is exactly the 33 letters of the modern alphabet.
+_DOC_WORD_RE = re.compile(
+    r'[ა-ჰ]+(?:-[ა-ჰ]+)+'                 # Hyphenated Georgian words
+    r'|[ა-ჰ]+-\d+'                        # Georgian + number like მე-5, საუკუნე-5
+    r'|[IVXLCDMivxlcdm]+(?=\s|$|[^\w])'   # Roman numerals (standalone)
+    r'|[ა-ჰ]+'                            # Regular Georgian words
+)
+_GEORGIAN_WORD_RE = re.compile(r'[ა-ჰ]+')
+
+# Punctuation stripped from both ends of matched words
+_STRIP_CHARS = '.,;:!?»"\')(«'
+
+
 class DocumentDictionaryBuilder:
     """Extract Georgian words from PDF and DOCX documents and merge with existing dictionary"""
     
@@ -17,61 +39,45 @@ class DocumentDictionaryBuilder:
         
     def extract_text_from_pdf(self, pdf_path: Path):
         """Extract text from PDF file using PyMuPDF"""
-        text = ""
+        parts = []
         try:
-            doc = fitz.open(pdf_path)
-            for page in doc:
-                text += page.get_text()
-            doc.close()
+            with fitz.open(pdf_path) as doc:
+                for page in doc:
+                    parts.append(page.get_text("text"))
         except Exception as e:
             print(f"Error reading PDF {pdf_path.name}: {e}")
-        return text
+        return "".join(parts)
     
     def extract_text_from_docx(self, docx_path: Path):
         """Extract text from DOCX file"""
-        text = ""
+        parts = []
         try:
             doc = Document(docx_path)
             for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
+                parts.append(paragraph.text + "\n")
         except Exception as e:
             print(f"Error reading DOCX {docx_path.name}: {e}")
-        return text
+        return "".join(parts)
     
     def extract_words(self, text):
         """Extract Georgian words with enhanced pattern matching"""
         word_counter = Counter()
         
-        # Enhanced pattern to capture:
-        # 1. Georgian words with hyphens: ნაწილ-ნაწილ
-        # 2. Ordinals with numbers: მე-5, მე-10
-        # 3. Georgian words with apostrophes: მ'ეუბნება
-        # 4. Roman numerals: I, II, III, IV, V, VI, VII, VIII, IX, X, XI, XII, etc.
-        # 5. Regular Georgian words
-        patterns = [
-            r'[ა-ჰ]+(?:-[ა-ჰ]+)+',  # Hyphenated Georgian words
-            r'მე-\d+',                # Ordinals like მე-5
-            r'[ა-ჰ]+-\d+',            # Georgian + number like საუკუნე-5
-            r'[IVXLCDMivxlcdm]+(?=\s|$|[^\w])',  # Roman numerals (standalone)
-            r'[ა-ჰ]+',                # Regular Georgian words
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, text)
+        for match in _DOC_WORD_RE.finditer(text):
+            word = match.group()
             
-            for word in matches:
-                # Clean up: remove trailing punctuation but keep internal hyphens
-                word = word.rstrip('.,;:!?»"\')')
-                word = word.lstrip('«"\'(')
-                
-                # Validate it's not empty and within length bounds
-                if word and self.min_word_length <= len(word) <= self.max_word_length:
-                    # Ensure UTF-8 compatible (Georgian characters)
-                    try:
-                        word.encode('utf-8')
-                        word_counter[word] += 1
-                    except UnicodeEncodeError:
-                        continue
+            # Clean up: remove surrounding punctuation but keep internal hyphens
+            word = word.strip(_STRIP_CHARS)
+            
+            # Validate it's not empty and within length bounds
+            if word and self.min_word_length <= len(word) <= self.max_word_length:
+                word_counter[word] += 1
+            
+            # Parts of compound words are counted as regular words too
+            if '-' in word:
+                for part in _GEORGIAN_WORD_RE.findall(word):
+                    if self.min_word_length <= len(part) <= self.max_word_length:
+                        word_counter[part] += 1
         
         return word_counter
     
@@ -86,23 +92,15 @@ class DocumentDictionaryBuilder:
         print(f"Found {len(pdf_files)} PDF files and {len(docx_files)} DOCX files")
         print(f"Processing {total_files} documents...")
         
-        processed = 0
-        
-        # Process PDFs
-        for pdf_path in pdf_files:
-            print(f"  [{processed+1}/{total_files}] Processing PDF: {pdf_path.name}")
-            text = self.extract_text_from_pdf(pdf_path)
-            if text:
-                all_text.append(text)
-            processed += 1
-        
-        # Process DOCX files
-        for docx_path in docx_files:
-            print(f"  [{processed+1}/{total_files}] Processing DOCX: {docx_path.name}")
-            text = self.extract_text_from_docx(docx_path)
-            if text:
-                all_text.append(text)
-            processed += 1
+        # Text extraction is CPU-bound, so files are processed on all cores
+        files = pdf_files + docx_files
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            texts = executor.map(_extract_one, files, chunksize=4)
+            for processed, (path, text) in enumerate(zip(files, texts)):
+                file_type = "PDF" if path.suffix.lower() == ".pdf" else "DOCX"
+                print(f"  [{processed+1}/{total_files}] Processed {file_type}: {path.name}")
+                if text:
+                    all_text.append(text)
         
         print(f"Successfully extracted text from {len(all_text)} documents")
         return all_text
@@ -138,39 +136,33 @@ class DocumentDictionaryBuilder:
         """Merge new words from documents with existing Wikipedia dictionary"""
         print("\nMerging dictionaries...")
         
-        # Create a lookup map for existing words
-        existing_words_map = {item["word"]: item for item in existing_dict["words"]}
+        # Existing frequencies, in dictionary order
+        merged_words = Counter({item["word"]: item["frequency"] for item in existing_dict["words"]})
         
         # Track statistics
-        updated_count = 0
-        new_count = 0
-        
-        # Merge new words
-        for word, frequency in new_words.items():
-            if word in existing_words_map:
-                # Update existing word frequency
-                existing_words_map[word]["frequency"] += frequency
-                updated_count += 1
-            else:
-                # Add new word
-                existing_words_map[word] = {
-                    "word": word,
-                    "frequency": frequency,
-                    "length": len(word)
-                }
-                new_count += 1
+        new_count = sum(1 for word in new_words if word not in merged_words)
+        updated_count = len(new_words) - new_count
+        
+        # Merge new words (Counter.update adds frequencies of existing words)
+        merged_words.update(new_words)
         
         print(f"  Updated {updated_count} existing words")
         print(f"  Added {new_count} new words")
         
-        # Recalculate weights and total occurrences
-        total_occurrences = sum(item["frequency"] for item in existing_words_map.values())
+        # Sort by frequency (descending), stable to keep ties in dictionary order
+        words = np.fromiter(merged_words.keys(), dtype=object, count=len(merged_words))
+        freqs = np.fromiter(merged_words.values(), dtype=np.int64, count=len(merged_words))
+        order = np.argsort(-freqs, kind="stable")
+        words, freqs = words[order], freqs[order]
         
-        for item in existing_words_map.values():
-            item["weight"] = item["frequency"] / total_occurrences
+        # Recalculate weights and total occurrences
+        total_occurrences = int(freqs.sum())
+        weights = freqs / total_occurrences
         
-        # Sort by frequency (descending)
-        word_list = sorted(existing_words_map.values(), key=lambda x: x["frequency"], reverse=True)
+        word_list = [
+            {"word": word, "frequency": frequency, "weight": weight, "length": len(word)}
+            for word, frequency, weight in zip(words.tolist(), freqs.tolist(), weights.tolist())
+        ]
         
         # Update metadata
         merged_dict = {
@@ -196,21 +188,39 @@ class DocumentDictionaryBuilder:
             json.dump(dictionary, f, ensure_ascii=False, indent=4)
         print(f"\nSaved JSON dictionary to {json_path}")
         
+        # Save as compressed NumPy arrays (used by the image generator, fast to load)
+        npz_path = output_dir / "ka_dictionary.npz"
+        words = dictionary["words"]
+        np.savez_compressed(
+            npz_path,
+            words=np.array([item["word"] for item in words], dtype=str),
+            frequency=np.array([item["frequency"] for item in words], dtype=np.int64),
+            weight=np.array([item["weight"] for item in words], dtype=np.float64),
+            length=np.array([item["length"] for item in words], dtype=np.int32),
+        )
+        print(f"Saved NumPy dictionary to {npz_path}")
+        
         # Save as plain text (just words)
         txt_path = output_dir / "ka_dictionary.txt"
         with open(txt_path, "w", encoding="utf-8") as f:
-            for item in dictionary["words"]:
-                f.write(f"{item['word']}\n")
+            f.write("".join(f"{item['word']}\n" for item in dictionary["words"]))
         print(f"Saved text dictionary to {txt_path}")
         
         # Save frequency-weighted list
         weighted_path = output_dir / "ka_dictionary_weighted.txt"
         with open(weighted_path, "w", encoding="utf-8") as f:
-            for item in dictionary["words"]:
-                f.write(f"{item['word']}\t{item['frequency']}\n")
+            f.write("".join(f"{item['word']}\t{item['frequency']}\n" for item in dictionary["words"]))
         print(f"Saved weighted dictionary to {weighted_path}")
 
 
+def _extract_one(path: Path) -> str:
+    """Worker function: extracts text from a single PDF or DOCX file"""
+    builder = DocumentDictionaryBuilder()
+    if path.suffix.lower() == ".pdf":
+        return builder.extract_text_from_pdf(path)
+    return builder.extract_text_from_docx(path)
+
+
 if __name__ == "__main__":
     builder = DocumentDictionaryBuilder()
     
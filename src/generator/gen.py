@@ -1,22 +1,101 @@
+import io
 import json
 import time
+import numpy as np
 
-from trdg.generators import GeneratorFromStrings
+from trdg.data_generator import FakeTextDataGenerator
+from trdg import computer_text_generator
+from PIL import Image, ImageFont
+import functools
 from utils import BASE_DIR
 from pathlib import Path
 import csv
 import random
+import re
 import os
 import zipfile
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from huggingface_hub import HfApi
+from huggingface_hub.errors import HfHubHTTPError
+import httpx
 from dotenv import load_dotenv
 
 
+# Georgian alphabet used for random character sequences
+# as UTF-32 code points, so a drawn array decodes straight into one string
+_KA_CODEPOINTS = np.array([ord(c) for c in "აბგდევზთიკლმნოპჟრსტუფქღყშჩცძწჭხჯჰ"], dtype="<u4")
+
+# NumPy generator (PCG64) for batched random draws, reseeded per worker by _init_worker
+_rng = np.random.default_rng()
+
+
+@functools.lru_cache(maxsize=256)
+def _load_font(font: str, size: int) -> ImageFont.FreeTypeFont:
+    """Load a font once per (path, size) instead of once per rendered image"""
+    return ImageFont.truetype(font=font, size=size)
+
+
+class _CachedImageFont:
+    """Stand-in for PIL.ImageFont with truetype going through _load_font,
+    every other attribute is taken from PIL.ImageFont itself"""
+
+    truetype = staticmethod(_load_font)
+
+    def __getattr__(self, name):
+        return getattr(ImageFont, name)
+
+
+# trdg calls ImageFont.truetype for every image it renders, route it through the cache.
+# This patches a module global of trdg.computer_text_generator, which relies on the
+# pinned trdg==0.1.1, so it's only done if the module uses PIL's ImageFont as expected.
+if getattr(computer_text_generator, "ImageFont", None) is ImageFont:
+    computer_text_generator.ImageFont = _CachedImageFont()
+
+# Pillow save options per output image format. PNG uses the fastest zlib level,
+# which for noisy backgrounds is ~3x faster than the default and no bigger.
+# Lossless WebP with the fastest preset is about as fast and ~2x smaller.
+IMAGE_SAVE_OPTIONS = {
+    "png": {"format": "PNG", "compress_level": 1, "optimize": False},
+    "webp": {"format": "WEBP", "lossless": True, "quality": 0, "method": 0},
+}
+
+# Each font's images are split into chunks of this size, so parallel workers
+# share the load evenly instead of waiting on the slowest font
+CHUNK_SIZE = 200
+
+# Dictionary shared by all tasks of a worker, set once by _init_worker
+_word_list = None
+_weights = None
+
+
+def _init_worker(word_list: list, weights: list):
+    """Store the dictionary in module globals so it isn't re-pickled for every task,
+    and give the worker its own random stream.
+
+    The seed mixes in the process id, so workers started at the same moment
+    (forked with identical generator state) never draw the same samples.
+    """
+    global _word_list, _weights, _rng
+    _word_list = word_list
+    _weights = weights
+    _rng = np.random.default_rng(np.random.SeedSequence([os.getpid(), time.time_ns()]))
+
+
 def load_dictionary(dict_path: Path = None) -> tuple[list, list]:
-    """Load dictionary once and return words with weights for efficient sampling"""
+    """Load dictionary once and return words with weights for efficient sampling
+
+    By default the compressed NumPy dictionary (ka_dictionary.npz) is loaded,
+    falling back to ka_dictionary.json if it's missing.
+    """
     if dict_path is None:
-        dict_path = BASE_DIR / "src" / "generator" / "dictionaries" / "ka_dictionary.json"
+        dict_dir = BASE_DIR / "src" / "generator" / "dictionaries"
+        dict_path = dict_dir / "ka_dictionary.npz"
+        if not dict_path.exists():
+            dict_path = dict_dir / "ka_dictionary.json"
+
+    if dict_path.suffix == ".npz":
+        with np.load(dict_path) as data:
+            return data["words"].tolist(), data["weight"].tolist()
 
     with open(dict_path, "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -27,34 +106,116 @@ def load_dictionary(dict_path: Path = None) -> tuple[list, list]:
     return word_list, weights
 
 
-def get_random_word(word_list: list, weights: list, exclude_special_chars: bool = False) -> str:
-    """Get a random word from the dictionary with frequency weighting
-    
+# Alias tables built by get_random_words_batch, keyed by id of the weights list
+_alias_tables = {}
+
+# Words matching this are skipped for fonts without number support
+_SPECIAL_CHARS_RE = re.compile(r'[-\d]')
+
+
+def _build_alias_table(weights: list) -> tuple[np.ndarray, np.ndarray]:
+    """Build Walker alias table (Vose's method) for O(1) weighted sampling
+
+    Returns:
+        Tuple of (prob, alias) arrays: pick a uniform index i, keep it with
+        probability prob[i], otherwise take alias[i]
+    """
+    n = len(weights)
+    scaled = np.asarray(weights, dtype=np.float64)
+    prob = (scaled * (n / scaled.sum())).tolist()
+    alias = list(range(n))
+
+    small = [i for i, p in enumerate(prob) if p < 1.0]
+    large = [i for i, p in enumerate(prob) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] -= 1.0 - prob[s]
+        if prob[l] < 1.0:
+            small.append(l)
+        else:
+            large.append(l)
+
+    # Whatever is left is 1 up to floating point error
+    for i in small + large:
+        prob[i] = 1.0
+
+    return np.array(prob), np.array(alias)
+
+
+def _get_alias_table(word_list: list, weights: list,
+                     exclude_special_chars: bool) -> tuple[list, np.ndarray, np.ndarray]:
+    """Return (words, prob, alias) for the given dictionary, building it on first use"""
+    key = (id(weights), exclude_special_chars)
+    table = _alias_tables.get(key)
+    # Cached table holds a reference to weights, so its id can't be reused while cached
+    if table is not None and table[0] is weights:
+        return table[1:]
+
+    words, word_weights = word_list, weights
+    if exclude_special_chars:
+        # Filter out words containing hyphens or numbers
+        has_special = _SPECIAL_CHARS_RE.search
+        valid_indices = [i for i, word in enumerate(word_list) if not has_special(word)]
+        if valid_indices:
+            words = [word_list[i] for i in valid_indices]
+            word_weights = [weights[i] for i in valid_indices]
+
+    prob, alias = _build_alias_table(word_weights)
+    _alias_tables[key] = (weights, words, prob, alias)
+    return words, prob, alias
+
+
+def get_random_words_batch(n: int, word_list: list, weights: list, exclude_special_chars: bool = False) -> list[str]:
+    """Get n random words from the dictionary with frequency weighting
+
+    Alias table for the dictionary is built once on first call, after that
+    all n words are drawn in a few vectorized calls, O(1) per word regardless
+    of dictionary size.
+
     Args:
+        n: Number of words to draw
         word_list: List of words
         weights: Corresponding weights
         exclude_special_chars: If True, exclude words with hyphens or numbers
     """
-    if exclude_special_chars:
-        # Filter out words containing hyphens or numbers
-        valid_indices = [i for i, word in enumerate(word_list) 
-                        if '-' not in word and not any(c.isdigit() for c in word)]
-        if valid_indices:
-            filtered_words = [word_list[i] for i in valid_indices]
-            filtered_weights = [weights[i] for i in valid_indices]
-            chosen = random.choices(filtered_words, weights=filtered_weights, k=1)[0]
-            return chosen
-    
-    chosen = random.choices(word_list, weights=weights, k=1)[0]
-    return chosen
+    words, prob, alias = _get_alias_table(word_list, weights, exclude_special_chars)
+    idx = _rng.integers(0, len(words), size=n)
+    idx = np.where(_rng.random(n) < prob[idx], idx, alias[idx])
+    return [words[i] for i in idx.tolist()]
+
+
+def get_random_word(word_list: list, weights: list, exclude_special_chars: bool = False) -> str:
+    """Get a random word from the dictionary with frequency weighting
+
+    Kept for single draws, generation itself uses get_random_words_batch.
+    """
+    return get_random_words_batch(1, word_list, weights, exclude_special_chars)[0]
+
+
+def get_random_sequences_batch(n: int, min_len: int = 3, max_len: int = 12) -> list[str]:
+    """Generate n random sequences of Georgian characters
+
+    Lengths and characters for all sequences are drawn in two vectorized calls
+    and the characters are decoded into a single string without a Python-level
+    join.
+    """
+    lengths = _rng.integers(min_len, max_len + 1, size=n)
+    char_idx = _rng.integers(0, len(_KA_CODEPOINTS), size=int(lengths.sum()))
+    chars = _KA_CODEPOINTS[char_idx].tobytes().decode("utf-32-le")
+    ends = np.cumsum(lengths).tolist()
+    starts = [0] + ends[:-1]
+    return [chars[start:end] for start, end in zip(starts, ends)]
 
 
 def get_random_sequence(length: int = None) -> str:
-    """Generate random sequence of Georgian characters"""
-    chars = "აბგდევზთიკლმნოპჟრსტუფქღყშჩცძწჭხჯჰ"
+    """Generate random sequence of Georgian characters
+
+    Kept for single draws, generation itself uses get_random_sequences_batch.
+    """
     if length is None:
-        length = random.randint(3, 12)
-    return "".join(random.choice(chars) for _ in range(length))
+        return get_random_sequences_batch(1)[0]
+    return get_random_sequences_batch(1, length, length)[0]
 
 
 def get_random_number() -> str:
@@ -82,104 +243,168 @@ def font_not_supports_numbers(font_path: str) -> bool:
     return font_name in fonts_without_numbers
 
 
+def _sample_texts(num_images: int, word_list: list, weights: list, no_number_support: bool) -> list[str]:
+    """Sample image texts: 90% real words, 7% random sequences, 3% numbers
+
+    For fonts without number support, words with hyphens or numbers are excluded
+    and random sequences are used instead of numbers. Words and random sequences
+    are each drawn in a single batch.
+    """
+    source_types = _rng.random(num_images)
+    is_word = source_types < 0.9
+    is_sequence = ~is_word if no_number_support else ~is_word & (source_types < 0.97)
+    words = iter(get_random_words_batch(int(is_word.sum()), word_list, weights,
+                                        exclude_special_chars=no_number_support))
+    sequences = iter(get_random_sequences_batch(int(is_sequence.sum())))
+
+    texts = []
+    for word, sequence in zip(is_word.tolist(), is_sequence.tolist()):
+        if word:
+            texts.append(next(words))
+        elif sequence:
+            texts.append(next(sequences))
+        else:
+            texts.append(get_random_number())
+
+    return texts
+
+
+def _save_image(img, fp, image_format: str, quantize: bool = False):
+    """Save image with IMAGE_SAVE_OPTIONS of the given format
+
+    If quantize is True, PNGs are stored as a 32 color palette image. This is meant
+    for text on a plain background, which only has a few hundred colors (mostly
+    antialiasing) to begin with: the file gets ~3x smaller and faster to write,
+    while pixels change by ~1 level on average.
+    """
+    if quantize and image_format == "png":
+        img = img.quantize(colors=32, method=Image.Quantize.FASTOCTREE)
+    img.save(fp, **IMAGE_SAVE_OPTIONS[image_format])
+
+
+def _encode_image(img, image_format: str, quantize: bool = False) -> bytes:
+    """Encode image in memory, see _save_image"""
+    buffer = io.BytesIO()
+    _save_image(img, buffer, image_format, quantize)
+    return buffer.getvalue()
+
+
+def _sample_render_params(n: int) -> list[dict]:
+    """Draw random trdg render parameters for n images, each kind in one batch"""
+    params = {
+        "size": _rng.integers(32, 96, endpoint=True, size=n),
+        "skewing_angle": _rng.integers(0, 10, endpoint=True, size=n),
+        "blur": _rng.integers(0, 1, endpoint=True, size=n),
+        "distorsion_type": _rng.integers(0, 3, endpoint=True, size=n),  # 0=none, 1=sine, 2=cosine, 3=random
+        "distorsion_orientation": _rng.integers(0, 2, endpoint=True, size=n),
+        # 0=gaussian, 1=plain white, 2=quasicrystal, 3=image
+        "background_type": _rng.integers(0, 2, endpoint=True, size=n),
+        "fit": _rng.random(n) < 0.5,
+    }
+    params = {name: values.tolist() for name, values in params.items()}
+    params["margins"] = [tuple(m) for m in _rng.integers(0, 10, endpoint=True, size=(n, 4)).tolist()]
+    return [dict(zip(params, values)) for values in zip(*params.values())]
+
+
 def _generate_for_font(args: tuple) -> list[dict]:
-    """Worker function: generates all images for a single font.
+    """Worker function: generates one chunk of images for a single font.
+    Expects the dictionary to be set by _init_worker.
     
     Args:
-        args: Tuple of (font_path, num_images, word_list, weights, output_dir, no_number_support)
+        args: Tuple of (font_path, chunk_start, chunk_size, output_dir, no_number_support, image_format,
+            to_archive, quantize)
     
     Returns:
-        List of metadata dicts for generated images
+        List of metadata dicts for generated images. If to_archive is True, images are
+        not saved to output_dir, encoded bytes are returned under the "image" key instead.
     """
-    font_path, num_images, word_list, weights, output_dir, no_number_support = args
+    font_path, chunk_start, chunk_size, output_dir, no_number_support, image_format, to_archive, quantize = args
     font_name = Path(font_path).stem
     metadata = []
     
-    # Generate text strings for this font
-    strings = []
-    for _ in range(num_images):
-        source_type = random.random()
-        
-        if no_number_support:
-            if source_type < 0.9:
-                text = get_random_word(word_list, weights, exclude_special_chars=True)
-            else:
-                text = get_random_sequence()
-        else:
-            if source_type < 0.9:
-                text = get_random_word(word_list, weights)
-            elif source_type < 0.97:
-                text = get_random_sequence()
-            else:
-                text = get_random_number()
-        
-        strings.append(text)
+    # Generate text strings for this chunk
+    strings = _sample_texts(chunk_size, _word_list, _weights, no_number_support)
+    render_params = _sample_render_params(chunk_size)
     
-    # Generate images one string at a time
-    for idx, text in enumerate(strings):
-        # generator = GeneratorFromStrings(
-        #     strings=[text],
-        #     fonts=[font_path],
-        #     language="ka",
-        #     size=64,
-        #     skewing_angle=5,
-        #     random_skew=True,
-        #     blur=1,
-        #     random_blur=True,
-        #     distorsion_type=3,
-        #     distorsion_orientation=2,
-        #     background_type=0,
-        #     text_color="#000000,#1a1a1a,#333333,#2b1a1a,#1a0f0f,#3d2b2b,#4a0000,#2d1f1f"
-        # )
-        generator = GeneratorFromStrings(
-            strings=[text],
-            fonts=[font_path],
-            language="ka",
-            size=random.randint(32, 96),
-            skewing_angle=random.randint(0, 10),
-            random_skew=True,
-            blur=random.randint(0, 1),
-            random_blur=True,
-            distorsion_type=random.randint(0, 3),  # 0=none, 1=sine, 2=cosine, 3=random
-            distorsion_orientation=random.randint(0, 2),
-            background_type=random.randint(0, 2),  # 0=gaussian, 1=plain white, 2=quasicrystal, 3=image
-            text_color="#000000,#1a1a1a,#333333,#2b1a1a,#1a0f0f,#3d2b2b,#4a0000,#2d1f1f",
-            margins=(random.randint(0, 10), random.randint(0, 10), random.randint(0, 10),
-                     random.randint(0, 10)),
-            fit=random.choice([True, False]),
-        )
-
-        img = next(generator)
-
-        if img is None:
-            continue
-
+    # Fixed arguments of trdg's FakeTextDataGenerator.generate, the random ones
+    # come from render_params. out_dir=None makes it return the image.
+    # This is trdg's internal signature as of the pinned 0.1.1 (trdg 1.x adds required parameters).
+    base_args = dict(
+        font=font_path,
+        out_dir=None,
+        extension=None,
+        random_skew=True,
+        random_blur=True,
+        is_handwritten=False,
+        name_format=0,
+        width=-1,
+        alignment=1,
+        text_color="#000000,#1a1a1a,#333333,#2b1a1a,#1a0f0f,#3d2b2b,#4a0000,#2d1f1f",
+        orientation=0,
+        space_width=1.0,
+    )
+
+    # Images are encoded and saved on background threads (Pillow releases the GIL
+    # while encoding), so rendering the next image overlaps with saving this one
+    save_futures = []
+    if not to_archive:
         image_group_dir = Path(output_dir) / font_name
         image_group_dir.mkdir(parents=True, exist_ok=True)
-        file_name = f"{font_name}_{idx:04d}.png"
-        img_save_path = Path(image_group_dir) / file_name
+        image_group_prefix = f"{image_group_dir}{os.sep}"
+
+    with ThreadPoolExecutor(max_workers=2) as save_pool:
+        # Generate images one string at a time, offsetting idx so file names stay unique across chunks
+        for idx, text in enumerate(strings, start=chunk_start):
+            img = FakeTextDataGenerator.generate(index=idx, text=text, **base_args,
+                                                 **render_params[idx - chunk_start])
 
-        img.save(img_save_path)
-        metadata.append({"file_name": f"{image_group_dir.stem}/{file_name}", "text": text})
+            if img is None:
+                continue
 
-    print(f"\nGenerated {len(metadata)} images for {font_name}")
+            file_name = f"{font_name}_{idx:04d}.{image_format}"
+            # Gaussian noise and quasicrystal backgrounds have too many colors to quantize without visible loss
+            quantize_img = quantize and render_params[idx - chunk_start]["background_type"] == 1
+
+            if to_archive:
+                future = save_pool.submit(_encode_image, img, image_format, quantize_img)
+                metadata.append({"file_name": f"{font_name}/{file_name}", "text": text, "image": future})
+                continue
+
+            img_save_path = image_group_prefix + file_name
+            save_futures.append(save_pool.submit(_save_image, img, img_save_path, image_format, quantize_img))
+            metadata.append({"file_name": f"{font_name}/{file_name}", "text": text})
+
+    # Surface any save errors and replace encode futures with image bytes
+    for future in save_futures:
+        future.result()
+    if to_archive:
+        for item in metadata:
+            item["image"] = item["image"].result()
+
+    print(f"\nGenerated {len(metadata)} images for {font_name} "
+          f"(images {chunk_start}-{chunk_start + chunk_size - 1})")
 
     return metadata
 
 
-def generate_imgs(num_images_per_font: int):
+def generate_imgs(num_images_per_font: int, image_format: str = "png", to_archive: bool = False,
+                  quantize: bool = False):
     """Generate synthetic images for all fonts.
 
     Args:
         num_images_per_font: Number of images to generate per font
-        parallel_threshold: Use parallel processing if num_images_per_font >= this value
+        image_format: Output image format, one of IMAGE_SAVE_OPTIONS keys ("png" or "webp")
+        to_archive: If True, write images straight into data/ka-ocr.zip instead of data/raw/,
+            skipping the separate zip_dataset() step
+        quantize: If True, PNGs on a plain white background are saved as 32 color palette
+            ("P" mode) images, which is lossy and mixes modes within the dataset (see _save_image)
     """
     ka_font_dir = BASE_DIR / "src" / "generator" / "fonts" / "ka"
     output_dir = BASE_DIR / "data" / "raw"
-    dict_path = BASE_DIR / "src" / "generator" / "dictionaries" / "ka_dictionary.json"
 
     # Get all font files (ttf and otf)
-    fonts = [str(f) for f in ka_font_dir.glob("*") if f.suffix.lower() in ['.ttf', '.otf']]
+    fonts = [entry.path for entry in os.scandir(ka_font_dir)
+             if entry.is_file() and entry.name.lower().endswith(('.ttf', '.otf'))]
     if not fonts:
         print(f"No font files (.ttf, .otf) found in {ka_font_dir}")
         return
@@ -194,7 +419,8 @@ def generate_imgs(num_images_per_font: int):
     if fonts_no_nums:
         print(f"Fonts without number support: {', '.join(fonts_no_nums)}\n")
 
-    output_dir.mkdir(parents=True, exist_ok=True)
+    if not to_archive:
+        output_dir.mkdir(parents=True, exist_ok=True)
 
     print(f"Generating images for {len(fonts)} fonts...")
     print(f"Images per font: {num_images_per_font}")
@@ -203,13 +429,15 @@ def generate_imgs(num_images_per_font: int):
 
     # Load dictionary
     print("\nLoading dictionary...")
-    word_list, weights = load_dictionary(dict_path)
+    word_list, weights = load_dictionary()
     print(f"Loaded {len(word_list)} words with frequency weights")
 
-    # Prepare args for each font
+    # Prepare args for each chunk of each font
     font_args = [
-        (font_path, num_images_per_font, word_list, weights, str(output_dir), fonts_without_number_support[font_path])
+        (font_path, chunk_start, min(CHUNK_SIZE, num_images_per_font - chunk_start), str(output_dir),
+         fonts_without_number_support[font_path], image_format, to_archive, quantize)
         for font_path in fonts
+        for chunk_start in range(0, num_images_per_font, CHUNK_SIZE)
     ]
 
     # Ask user model of image generation
@@ -224,38 +452,89 @@ def generate_imgs(num_images_per_font: int):
         else:
             print("Please enter either 'Y' or 'N'.")
 
-    # Run image generation either with multiple CPU cores, or sequentially
-    t1 = time.perf_counter()
-    if use_parallel:
-        num_workers = min(os.cpu_count() or 1, len(fonts))
-        print(f"\nUsing parallel processing with {num_workers} workers...\n")
+    # Labels are written to CSV as each chunk finishes, so memory stays flat
+    # and a partial CSV is kept if the run is interrupted
+    csv_path = BASE_DIR / "data" / "metadata.csv"
+    csv_path.parent.mkdir(parents=True, exist_ok=True)
+    zip_path = BASE_DIR / "data" / "ka-ocr.zip"
+    num_generated = 0
 
-        with ProcessPoolExecutor(max_workers=num_workers) as executor:
-            results = list(executor.map(_generate_for_font, font_args))
+    # Images are already compressed, so archive entries are stored as is. The archive is
+    # written under a temporary name and only replaces ka-ocr.zip once it's complete.
+    partial_zip_path = zip_path.with_name(f"{zip_path.name}.partial")
+    archive = zipfile.ZipFile(partial_zip_path, "w", zipfile.ZIP_STORED) if to_archive else None
 
-        metadata = [item for result in results for item in result]
-    else:
-        print("\nUsing sequential processing...\n")
-        metadata = []
-        for font_idx, args in enumerate(font_args):
-            font_name = Path(args[0]).stem
-            print(f"[{font_idx+1}/{len(fonts)}] Processing font: {font_name}")
-            result = _generate_for_font(args)
-            metadata.extend(result)
+    # Run image generation either with multiple CPU cores, or sequentially
+    t1 = time.perf_counter()
+    try:
+        with open(csv_path, mode="w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["file_name", "text"], extrasaction="ignore")
+            writer.writeheader()
+
+            def write_result(result: list[dict]):
+                nonlocal num_generated
+                writer.writerows(result)
+                f.flush()
+                if archive is not None:
+                    for item in result:
+                        archive.writestr(item["file_name"], item["image"])
+                num_generated += len(result)
+
+            if use_parallel:
+                num_workers = min(os.cpu_count() or 1, len(font_args))
+                print(f"\nUsing parallel processing with {num_workers} workers...\n")
+
+                with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                                         initargs=(word_list, weights)) as executor:
+                    # Results are written in completion order, so a slow chunk doesn't hold up the rest.
+                    # The futures list isn't kept: as_completed drops each future (and its
+                    # result, which holds encoded images in archive mode) once it's yielded.
+                    for future in as_completed([executor.submit(_generate_for_font, args)
+                                                for args in font_args]):
+                        write_result(future.result())
+            else:
+                print("\nUsing sequential processing...\n")
+                _init_worker(word_list, weights)
+                for chunk_idx, args in enumerate(font_args):
+                    font_name = Path(args[0]).stem
+                    print(f"[{chunk_idx+1}/{len(font_args)}] Processing font: {font_name}")
+                    write_result(_generate_for_font(args))
+
+        if archive is not None:
+            # Add metadata.csv to zip root
+            archive.write(csv_path, arcname="metadata.csv")
+            archive.close()
+            os.replace(partial_zip_path, zip_path)
+    except BaseException:
+        # Don't leave a half-written archive behind, any previous ka-ocr.zip stays as it was
+        if archive is not None:
+            archive.close()
+            partial_zip_path.unlink(missing_ok=True)
+        raise
     t2 = time.perf_counter()
     print(f"\nDone in {(t2 - t1)} seconds")
 
-    # Write Labels to CSV
-    csv_path = BASE_DIR / "data" / "metadata.csv"
-    with open(csv_path, mode="w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["file_name", "text"])
-        writer.writeheader()
-        writer.writerows(metadata)
-
-    print(f"\n✓ Finished! {len(metadata)} images saved to {output_dir}")
+    if archive is not None:
+        zip_size_mb = zip_path.stat().st_size / (1024 * 1024)
+        print(f"\n✓ Finished! {num_generated} images saved to {zip_path} ({zip_size_mb:.2f} MB)")
+    else:
+        print(f"\n✓ Finished! {num_generated} images saved to {output_dir}")
     print(f"✓ Labels saved to {csv_path}")
 
 
+def _scan_files(directory: str, suffixes: tuple, prefix: str = ""):
+    """Recursively yield (path, path relative to directory) of files with given suffixes
+
+    Uses os.scandir, which gets file types from the directory listing itself
+    instead of a stat call and Path object per file like Path.glob.
+    """
+    for entry in os.scandir(directory):
+        if entry.is_dir(follow_symlinks=False):
+            yield from _scan_files(entry.path, suffixes, f"{prefix}{entry.name}/")
+        elif entry.name.endswith(suffixes):
+            yield entry.path, prefix + entry.name
+
+
 def zip_dataset():
     """Zip the dataset preserving font subdirectory structure."""
     data_dir = BASE_DIR / "data"
@@ -269,24 +548,25 @@ def zip_dataset():
         return
 
     # Find all images in subdirectories
-    image_files = list(raw_dir.glob("**/*.png"))
+    image_suffixes = tuple(f".{image_format}" for image_format in IMAGE_SAVE_OPTIONS)
+    image_files = sorted(_scan_files(str(raw_dir), image_suffixes), key=lambda file: file[1])
     if not image_files:
         print("Error: No images found in data/raw/")
         return
 
     print(f"\nCreating zip file with {len(image_files)} images...")
 
-    # Create zip file preserving subdirectory structure
+    # Create zip file preserving subdirectory structure. Images are already
+    # compressed, so they are stored as is rather than deflated a second time.
     t1 = time.perf_counter()
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
         num_images = len(image_files)
-        for i, img_file in enumerate(image_files):
+        for i, (img_path, arcname) in enumerate(image_files):
             print(f"\radding image {i+1}/{num_images}...", end="", flush=True)
-            arcname = img_file.relative_to(raw_dir)
-            zipf.write(img_file, arcname=arcname)
+            zipf.write(img_path, arcname=arcname)
 
         # Add metadata.csv to zip root
-        zipf.write(metadata_file, arcname="metadata.csv")
+        zipf.write(metadata_file, arcname="metadata.csv", compress_type=zipfile.ZIP_DEFLATED)
 
     zip_size_mb = zip_path.stat().st_size / (1024 * 1024)
     t2 = time.perf_counter()
@@ -294,6 +574,15 @@ def zip_dataset():
     print(f"Zipped in {(t2 - t1):.2f} seconds")
 
 
+def _is_transient_upload_error(e: Exception) -> bool:
+    """Check if a failed upload is worth retrying: network errors, rate limits and 5xx responses"""
+    if isinstance(e, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(e, HfHubHTTPError) and e.response is not None:
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return False
+
+
 def dataset_to_hf():
     """Upload existing zip file to Hugging Face Hub."""
     load_dotenv()
@@ -316,18 +605,27 @@ def dataset_to_hf():
         print(f"Error: Zip file not found at {zip_path}")
         return
     
-    # Push to Hugging Face
+    # Push to Hugging Face. huggingface_hub uploads through hf_xet, which splits the
+    # file into chunks sent in parallel and skips chunks the Hub already has, so
+    # retrying after a network failure only sends what is still missing. Other errors
+    # (bad token, missing repo, ...) won't go away on retry and fail right away.
     print(f"\nPushing to Hugging Face: {hf_dataset_repo}")
-    try:
-        api = HfApi()
-        api.upload_file(
-            path_or_fileobj=str(zip_path),
-            path_in_repo="ka-ocr.zip",
-            repo_id=hf_dataset_repo,
-            repo_type="dataset",
-            token=hf_token
-        )
-        print(f"Successfully uploaded to https://huggingface.co/datasets/{hf_dataset_repo}")
-    except Exception as e:
-        print(f"Failed to upload to Hugging Face: {e}")
-
+    api = HfApi()
+    max_attempts = 3
+    for attempt in range(1, max_attempts + 1):
+        try:
+            api.upload_file(
+                path_or_fileobj=str(zip_path),
+                path_in_repo="ka-ocr.zip",
+                repo_id=hf_dataset_repo,
+                repo_type="dataset",
+                token=hf_token
+            )
+            print(f"Successfully uploaded to https://huggingface.co/datasets/{hf_dataset_repo}")
+            return
+        except Exception as e:
+            if attempt == max_attempts or not _is_transient_upload_error(e):
+                print(f"Failed to upload to Hugging Face: {e}")
+                return
+            print(f"Upload attempt {attempt}/{max_attempts} failed, retrying: {e}")
+            time.sleep(5 * attempt)
@@ -1,4 +1,4 @@
-from generator.gen import generate_imgs, dataset_to_hf, zip_dataset
+from generator.gen import generate_imgs, dataset_to_hf, zip_dataset, IMAGE_SAVE_OPTIONS
 
 
 if __name__ == "__main__":
@@ -10,10 +10,44 @@ if __name__ == "__main__":
             continue
         else:
             break
-    generate_imgs(int(user_input))
+    num_images_per_font = int(user_input)
 
-    # Zipping the dataset
     while True:
+        user_input = input("\nWhich image format would you like to use? (PNG/WEBP): ")
+        if user_input.lower() in IMAGE_SAVE_OPTIONS:
+            image_format = user_input.lower()
+            break
+        else:
+            print("Please enter either 'PNG' or 'WEBP'.")
+
+    while True:
+        user_input = input("\nDo you want to write images directly into the zip archive "
+                           "instead of data/raw/? (Y/N): ")
+        if user_input.lower() == "y":
+            to_archive = True
+            break
+        elif user_input.lower() == "n":
+            to_archive = False
+            break
+        else:
+            print("Please enter either 'Y' or 'N'.")
+
+    # Palette PNGs are smaller and faster to write, but lossy and not RGB
+    quantize = False
+    while image_format == "png":
+        user_input = input("\nDo you want to save plain-background PNGs as 32 color palette images? "
+                           "(smaller, but lossy and in 'P' mode) (Y/N): ")
+        if user_input.lower() == "y":
+            quantize = True
+            break
+        elif user_input.lower() == "n":
+            break
+        else:
+            print("Please enter either 'Y' or 'N'.")
+    generate_imgs(num_images_per_font, image_format, to_archive, quantize)
+
+    # Zipping the dataset (already done if images were written to the archive)
+    while not to_archive:
         user_input = input("\nDo you want to zip the dataset? (Y/N): ")
         if user_input.lower() == "y":
             zip_dataset()